@@ -0,0 +1,69 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""Compare resident memory per tenant for `Vapid02` and `CompactVapid`.
+
+    python bench/memory_per_tenant.py [tenant_count]
+
+"""
+
+import gc
+import os
+import sys
+import tracemalloc
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from py_vapid import Vapid02
+from py_vapid.compact import CompactVapid
+
+
+def rss():
+    """Resident set size in bytes, or 0 where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError):
+        return 0
+
+
+def random_scalar():
+    key = ec.generate_private_key(ec.SECP256R1(), default_backend())
+    return key.private_numbers().private_value
+
+
+def derive(scalar):
+    return ec.derive_private_key(scalar, ec.SECP256R1(), default_backend())
+
+
+def measure(label, scalars, build):
+    gc.collect()
+    rss_before = rss()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    signers = [build(derive(scalar)) for scalar in scalars]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    rss_after = rss()
+    print("{:<14} {:>8,.0f} B/tenant (python heap) {:>8,.0f} B/tenant (rss)"
+          .format(label,
+                  (after - before) / len(signers),
+                  (rss_after - rss_before) / len(signers)))
+    return signers
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    scalars = [random_scalar() for _ in range(count)]
+    print("{} tenants".format(count))
+    # Run the compact signer first so the RSS delta isn't hidden by memory
+    # the allocator kept around after the larger run.
+    compact = measure("CompactVapid", scalars, CompactVapid.from_private_key)
+    full = measure("Vapid02", scalars, Vapid02)
+    assert len(compact) == len(full)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,8 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import os
+import asyncio
+import functools
 import logging
 import binascii
 import time
@@ -14,14 +16,23 @@ from cryptography.hazmat.primitives.asymmetric import ec, utils as ecutils
 from cryptography.hazmat.primitives import serialization
 
 from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.exceptions import InvalidSignature
 
-from py_vapid.utils import b64urldecode, b64urlencode
+from py_vapid.crypto_key import CryptoKey
+from py_vapid.profiling import profiled, stage
+from py_vapid.utils import b64urldecode, b64urlencode, write_atomic
 from py_vapid.jwt import sign
 
 # Show compliance version. For earlier versions see previously tagged releases.
 VERSION = "VAPID-RFC/ECE-RFC"
 
+# Order of the P-256 base point.
+P256_ORDER = 0xFFFFFFFF00000000FFFFFFFFFFFFFFFFBCE6FAADA7179E84F3B9CAC2FC632551
+
+# Number of derived private keys to keep around (see `Vapid01.derive`).
+DERIVE_CACHE_SIZE = 4096
+
 
 class VapidException(Exception):
     """An exception wrapper for Vapid."""
@@ -38,6 +49,7 @@ class Vapid01(object):
 
     _private_key = None
     _public_key = None
+    _crypto_key_param = None
     _schema = "WebPush"
 
     def __init__(self, private_key=None, conf=None):
@@ -71,6 +83,24 @@ class Vapid01(object):
         )
         return cls(key)
 
+    @classmethod
+    def derive(cls, master_secret, tenant_id):
+        """Initialize VAPID with a key derived from a master secret.
+
+        The same secret and tenant id always produce the same key, so
+        per-tenant keys do not need to be stored. Recently derived keys are
+        kept in a process-wide, bounded LRU, which holds a copy of
+        `master_secret` for as long as one of its keys is cached. Call
+        `py_vapid.clear_derive_cache` to drop them.
+
+        :param master_secret: Secret shared by all tenants, at least 32 octets
+        :type master_secret: bytes or bytearray
+        :param tenant_id: Tenant identifier
+        :type tenant_id: str
+
+        """
+        return cls(_derived_key(bytes(master_secret), tenant_id))
+
     @classmethod
     def from_raw_public(cls, public_raw):
         key = ec.EllipticCurvePublicKey.from_encoded_point(
@@ -105,6 +135,7 @@ class Vapid01(object):
         return cls(key)
 
     @classmethod
+    @profiled("from_file")
     def from_file(cls, private_key_file=None):
         """Initialize VAPID using a file containing a private key in PEM or
         DER format.
@@ -117,8 +148,11 @@ class Vapid01(object):
             logging.info("Private key not found, generating key...")
             vapid = cls()
             vapid.generate_keys()
-            vapid.save_key(private_key_file)
-            return vapid
+            if write_atomic(
+                private_key_file, vapid.private_pem(), overwrite=False
+            ):
+                return vapid
+            logging.info("Private key created concurrently, loading...")
         with open(private_key_file, "r") as file:
             private_key = file.read()
         try:
@@ -131,6 +165,22 @@ class Vapid01(object):
             logging.error("Could not open private key file: %s", repr(exc))
             raise VapidException(exc)
 
+    @classmethod
+    async def afrom_file(cls, private_key_file=None):
+        """Asynchronous version of `from_file`.
+
+        File access and any key generation run in the event loop's default
+        executor, so the loop is not blocked.
+
+        :param private_key_file: Name of the file containing the private key
+        :type private_key_file: str
+
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, cls.from_file, private_key_file
+        )
+
     @classmethod
     def from_string(cls, private_key):
         """Initialize VAPID using a string containing the private key. This
@@ -148,15 +198,24 @@ class Vapid01(object):
         return cls.from_der(pkey)
 
     @classmethod
+    @profiled("verify")
     def verify(cls, key, auth):
         """Verify a VAPID authorization token.
 
-        :param key: base64 serialized public key
-        :type key: str
+        :param key: base64 serialized public key, or the whole `Crypto-Key`
+            header holding it as `p256ecdsa`
+        :type key: str or CryptoKey
         :param auth: authorization token
         type key: str
 
         """
+        # A bare key holds no "=" other than trailing Base64 padding.
+        if isinstance(key, CryptoKey) or "=" in key.rstrip("="):
+            if not isinstance(key, CryptoKey):
+                key = CryptoKey.parse(key)
+            key = key.get("p256ecdsa")
+            if not key:
+                raise VapidException("Crypto-Key missing 'p256ecdsa' value")
         tokens = auth.rsplit(" ", 1)[1].rsplit(".", 1)
         kp = cls().from_raw_public(key.encode())
         return kp.verify_token(
@@ -179,6 +238,7 @@ class Vapid01(object):
 
         """
         self._private_key = value
+        self._crypto_key_param = None
         if value:
             self._public_key = self.private_key.public_key()
 
@@ -195,6 +255,24 @@ class Vapid01(object):
         """
         return self._public_key
 
+    @property
+    def crypto_key_param(self):
+        """The `p256ecdsa=` Crypto-Key parameter for the public key.
+
+        Computed once per key.
+
+        :returns str
+
+        """
+        if self._crypto_key_param is None:
+            self._crypto_key_param = "p256ecdsa=" + b64urlencode(
+                self.public_key.public_bytes(
+                    serialization.Encoding.X962,
+                    serialization.PublicFormat.UncompressedPoint,
+                )
+            )
+        return self._crypto_key_param
+
     def generate_keys(self):
         """Generate a valid ECDSA Key Pair."""
         self.private_key = ec.generate_private_key(ec.SECP256R1(), default_backend())
@@ -215,13 +293,13 @@ class Vapid01(object):
     def save_key(self, key_file):
         """Save the private key to a PEM file.
 
+        The file is replaced atomically and is only readable by its owner.
+
         :param key_file: The file path to save the private key data
         :type key_file: str
 
         """
-        with open(key_file, "wb") as file:
-            file.write(self.private_pem())
-            file.close()
+        write_atomic(key_file, self.private_pem())
 
     def save_public_key(self, key_file):
         """Save the public key to a PEM file.
@@ -229,10 +307,29 @@ class Vapid01(object):
         :type key_file: str
 
         """
-        with open(key_file, "wb") as file:
-            file.write(self.public_pem())
-            file.close()
+        write_atomic(key_file, self.public_pem(), mode=0o644)
+
+    async def asave_key(self, key_file):
+        """Asynchronous version of `save_key`.
 
+        :param key_file: The file path to save the private key data
+        :type key_file: str
+
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.save_key, key_file)
+
+    async def asave_public_key(self, key_file):
+        """Asynchronous version of `save_public_key`.
+
+        :param key_file: The name of the file to save the public key
+        :type key_file: str
+
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.save_public_key, key_file)
+
+    @profiled("verify_token")
     def verify_token(self, validation_token, verification_token):
         """Internally used to verify the verification token is correct.
 
@@ -244,64 +341,43 @@ class Vapid01(object):
         :rtype: boolean
 
         """
-        hsig = b64urldecode(verification_token.encode("utf8"))
-        r = int(binascii.hexlify(hsig[:32]), 16)
-        s = int(binascii.hexlify(hsig[32:]), 16)
+        with stage("decode_signature"):
+            hsig = b64urldecode(verification_token.encode("utf8"))
+            r = int(binascii.hexlify(hsig[:32]), 16)
+            s = int(binascii.hexlify(hsig[32:]), 16)
+            signature = ecutils.encode_dss_signature(r, s)
         try:
-            self.public_key.verify(
-                ecutils.encode_dss_signature(r, s),
-                validation_token,
-                signature_algorithm=ec.ECDSA(hashes.SHA256()),
-            )
+            with stage("ecdsa"):
+                self.public_key.verify(
+                    signature,
+                    validation_token,
+                    signature_algorithm=ec.ECDSA(hashes.SHA256()),
+                )
             return True
         except InvalidSignature:
             return False
 
     def _base_sign(self, claims):
-        cclaims = copy.deepcopy(claims)
-        if not cclaims.get("exp"):
-            cclaims["exp"] = int(time.time()) + 86400
-        if not self.conf.get("no-strict", False):
-            valid = _check_sub(cclaims.get("sub", ""))
-        else:
-            valid = cclaims.get("sub") is not None
-        if not valid:
-            raise VapidException(
-                "Missing 'sub' from claims. "
-                "'sub' is your admin email as a mailto: link."
-            )
-        if not re.match(
-            r"^https?://[^/:]+(:\d+)?$", cclaims.get("aud", ""), re.IGNORECASE
-        ):
-            raise VapidException(
-                "Missing 'aud' from claims. "
-                "'aud' is the scheme, host and optional port for this "
-                "transaction e.g. https://example.com:8080"
-            )
-        return cclaims
+        strict = not self.conf.get("no-strict", False)
+        return _check_claims(claims, strict=strict)
 
+    @profiled("sign")
     def sign(self, claims, crypto_key=None):
         """Sign a set of claims.
         :param claims: JSON object containing the JWT claims to use.
         :type claims: dict
         :param crypto_key: Optional existing crypto_key header content. The
             vapid public key will be appended to this data.
-        :type crypto_key: str
+        :type crypto_key: str or CryptoKey
         :returns: a hash containing the header fields to use in
             the subscription update.
         :rtype: dict
 
         """
         sig = sign(self._base_sign(claims), self.private_key)
-        pkey = "p256ecdsa="
-        pkey += b64urlencode(
-            self.public_key.public_bytes(
-                serialization.Encoding.X962,
-                serialization.PublicFormat.UncompressedPoint,
-            )
-        )
+        pkey = self.crypto_key_param
         if crypto_key:
-            crypto_key = crypto_key + ";" + pkey
+            crypto_key = "{};{}".format(crypto_key, pkey)
         else:
             crypto_key = pkey
 
@@ -320,6 +396,7 @@ class Vapid02(Vapid01):
 
     _schema = "vapid"
 
+    @profiled("sign")
     def sign(self, claims, crypto_key=None):
         """Generate an authorization token
 
@@ -343,6 +420,7 @@ class Vapid02(Vapid01):
         }
 
     @classmethod
+    @profiled("verify")
     def verify(cls, auth):
         """Ensure that the token is correctly formatted and valid
 
@@ -366,6 +444,80 @@ class Vapid02(Vapid01):
         )
 
 
+def derive_private_value(master_secret, tenant_id):
+    """Derive a P-256 private scalar for `tenant_id` from `master_secret`.
+
+    48 octets of HKDF-SHA256 output are reduced into [1, n-1], which keeps
+    the bias from the reduction negligible (FIPS 186-4, B.4.1). Changing
+    this function changes every derived key.
+
+    :param master_secret: Secret shared by all tenants, at least 32 octets
+    :type master_secret: bytes
+    :param tenant_id: Tenant identifier
+    :type tenant_id: str
+    :rtype: int
+
+    """
+    if len(master_secret) < 32:
+        raise VapidException("Master secret must be at least 32 bytes long")
+    okm = HKDF(
+        algorithm=hashes.SHA256(),
+        length=48,
+        salt=b"py_vapid derive",
+        info=tenant_id.encode("utf8"),
+    ).derive(master_secret)
+    return int.from_bytes(okm, "big") % (P256_ORDER - 1) + 1
+
+
+@functools.lru_cache(maxsize=DERIVE_CACHE_SIZE)
+def _derived_key(master_secret, tenant_id):
+    # `master_secret` is part of the cache key, so callers pass bytes.
+    return ec.derive_private_key(
+        derive_private_value(master_secret, tenant_id),
+        curve=ec.SECP256R1(),
+        backend=default_backend(),
+    )
+
+
+def clear_derive_cache():
+    """Drop every cached derived key, and the master secrets they hold."""
+    _derived_key.cache_clear()
+
+
+@profiled("_base_sign")
+def _check_claims(claims, strict=True):
+    """Return a validated copy of `claims`, adding a default `exp`.
+
+    :param claims: JSON object containing the JWT claims to use.
+    :type claims: dict
+    :param strict: Require `sub` to be a `mailto:` or `https:` URL
+    :type strict: bool
+    :rtype: dict
+
+    """
+    cclaims = copy.deepcopy(claims)
+    if not cclaims.get("exp"):
+        cclaims["exp"] = int(time.time()) + 86400
+    if strict:
+        valid = _check_sub(cclaims.get("sub", ""))
+    else:
+        valid = cclaims.get("sub") is not None
+    if not valid:
+        raise VapidException(
+            "Missing 'sub' from claims. "
+            "'sub' is your admin email as a mailto: link."
+        )
+    if not re.match(
+        r"^https?://[^/:]+(:\d+)?$", cclaims.get("aud", ""), re.IGNORECASE
+    ):
+        raise VapidException(
+            "Missing 'aud' from claims. "
+            "'aud' is the scheme, host and optional port for this "
+            "transaction e.g. https://example.com:8080"
+        )
+    return cclaims
+
+
 def _check_sub(sub):
     """Check to see if the `sub` is a properly formatted `mailto:`
 
@@ -0,0 +1,141 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import collections
+import functools
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from cryptography.hazmat.primitives import serialization
+
+from py_vapid import Vapid02, VapidException, _derived_key
+from py_vapid.utils import b64urlencode
+
+# Keys generated per worker task. Large enough to amortize the process
+# round trip, small enough that records start streaming quickly.
+CHUNK_SIZE = 256
+
+
+def _record(vapid):
+    return {
+        "private_key": vapid.private_pem().decode("utf8"),
+        "public_key": vapid.public_pem().decode("utf8"),
+        "applicationServerKey": b64urlencode(
+            vapid.public_key.public_bytes(
+                serialization.Encoding.X962,
+                serialization.PublicFormat.UncompressedPoint,
+            )
+        ),
+    }
+
+
+def _generate_chunk(count):
+    records = []
+    for _ in range(count):
+        vapid = Vapid02()
+        vapid.generate_keys()
+        records.append(_record(vapid))
+    return records
+
+
+def generate_many(count, workers=None, chunk_size=CHUNK_SIZE):
+    """Generate `count` VAPID key pairs, spread across processes.
+
+    Records are yielded as they are produced, in the order their chunks
+    were scheduled. At most two chunks per worker are in flight, so
+    callers can stream them out without holding the whole batch in
+    memory.
+
+    :param count: Number of key pairs to generate
+    :type count: int
+    :param workers: Number of worker processes, defaults to the CPU count.
+        Use 1 to generate in the calling process.
+    :type workers: int
+    :param chunk_size: Keys generated per worker task
+    :type chunk_size: int
+    :returns: iterator of dicts holding the `private_key` and `public_key`
+        PEM strings and the `applicationServerKey`
+
+    """
+    if count < 0:
+        raise VapidException("Key count must not be negative")
+    if chunk_size < 1:
+        raise VapidException("Chunk size must be at least 1")
+    chunks = [chunk_size] * (count // chunk_size)
+    if count % chunk_size:
+        chunks.append(count % chunk_size)
+    return _run_chunks(_generate_chunk, chunks, workers or os.cpu_count() or 1)
+
+
+def _run_chunks(func, chunks, workers):
+    """Yield the items of `func(chunk)` for each chunk, in order.
+
+    At most two chunks per worker are in flight at once.
+
+    """
+    if workers == 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            for item in func(chunk):
+                yield item
+        return
+    chunks = iter(chunks)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque(
+            executor.submit(func, chunk)
+            for chunk in itertools.islice(chunks, workers * 2)
+        )
+        while pending:
+            items = pending.popleft().result()
+            chunk = next(chunks, None)
+            if chunk is not None:
+                pending.append(executor.submit(func, chunk))
+            for item in items:
+                yield item
+
+
+def _derive_chunk(master_secret, tenant_ids):
+    keys = []
+    for tenant_id in tenant_ids:
+        key = _derived_key.__wrapped__(master_secret, tenant_id)
+        keys.append((tenant_id, b64urlencode(
+            key.public_key().public_bytes(
+                serialization.Encoding.X962,
+                serialization.PublicFormat.UncompressedPoint,
+            )
+        )))
+    return keys
+
+
+def derive_many(master_secret, tenant_ids, workers=None,
+                chunk_size=CHUNK_SIZE):
+    """Derive the `applicationServerKey` of many tenants, across processes.
+
+    Keys are derived as by `py_vapid.Vapid01.derive`, without filling its
+    cache. At most two chunks per worker are in flight at once.
+
+    :param master_secret: Secret shared by all tenants, at least 32 octets
+    :type master_secret: bytes or bytearray
+    :param tenant_ids: Tenant identifiers
+    :type tenant_ids: iterable
+    :param workers: Number of worker processes, defaults to the CPU count.
+        Use 1 to derive in the calling process.
+    :type workers: int
+    :param chunk_size: Tenants handled per worker task
+    :type chunk_size: int
+    :returns: iterator of `(tenant_id, applicationServerKey)` pairs, in
+        the order of `tenant_ids`
+
+    """
+    if len(master_secret) < 32:
+        raise VapidException("Master secret must be at least 32 bytes long")
+    if chunk_size < 1:
+        raise VapidException("Chunk size must be at least 1")
+    tenant_ids = list(tenant_ids)
+    chunks = [
+        tenant_ids[i:i + chunk_size]
+        for i in range(0, len(tenant_ids), chunk_size)
+    ]
+    return _run_chunks(functools.partial(_derive_chunk, bytes(master_secret)),
+                       chunks, workers or os.cpu_count() or 1)
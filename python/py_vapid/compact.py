@@ -0,0 +1,176 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import collections
+import functools
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives import serialization
+
+from py_vapid import Vapid02, _check_claims, _derived_key
+from py_vapid.utils import b64urldecode, b64urlencode, num_to_bytes
+from py_vapid.jwt import sign
+from py_vapid.profiling import profiled
+
+# Number of materialized key objects to keep around. Signers beyond this
+# count rebuild their key from the raw scalar on demand.
+KEY_CACHE_SIZE = 1024
+
+
+@functools.lru_cache(maxsize=KEY_CACHE_SIZE)
+def _private_key(private_raw):
+    return ec.derive_private_key(
+        int.from_bytes(private_raw, "big"),
+        curve=ec.SECP256R1(),
+        backend=default_backend(),
+    )
+
+
+@functools.lru_cache(maxsize=KEY_CACHE_SIZE)
+def _public_key(public_raw):
+    return ec.EllipticCurvePublicKey.from_encoded_point(
+        curve=ec.SECP256R1(), data=public_raw
+    )
+
+
+_CompactVapid = collections.namedtuple(
+    "CompactVapid", ["private_raw", "public_raw", "strict"]
+)
+
+
+class CompactVapid(_CompactVapid):
+    """Immutable, slotted RFC8292 signer.
+
+    Only the raw 32 octet private scalar and the 65 octet uncompressed
+    public point are stored. The `cryptography` key objects are built on
+    first use and shared through a bounded LRU, so holding one of these per
+    tenant costs a couple of hundred bytes instead of a full `Vapid02`.
+
+    """
+
+    __slots__ = ()
+    _schema = Vapid02._schema
+
+    def __repr__(self):
+        # Never show the private scalar, e.g. in logs or tracebacks.
+        return "CompactVapid(application_server_key={!r}, strict={!r})".format(
+            self.application_server_key, self.strict
+        )
+
+    def __eq__(self, other):
+        return type(other) is type(self) and tuple.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((type(self), self.public_raw))
+
+    @classmethod
+    def from_vapid(cls, vapid):
+        """Build a compact signer from an existing `Vapid01`/`Vapid02`.
+
+        :param vapid: A Vapid instance holding a private key
+        :type vapid: Vapid01
+
+        """
+        return cls.from_private_key(
+            vapid.private_key, strict=not vapid.conf.get("no-strict", False)
+        )
+
+    @classmethod
+    def from_private_key(cls, private_key, strict=True):
+        """Build a compact signer from a private key object.
+
+        :param private_key: A private key object
+        :type private_key: ec.EllipticCurvePrivateKey
+        :param strict: Require `sub` to be a `mailto:` or `https:` URL
+        :type strict: bool
+
+        """
+        return cls(
+            num_to_bytes(private_key.private_numbers().private_value, 32),
+            private_key.public_key().public_bytes(
+                serialization.Encoding.X962,
+                serialization.PublicFormat.UncompressedPoint,
+            ),
+            strict,
+        )
+
+    @classmethod
+    def from_raw(cls, private_raw, strict=True):
+        """Build a compact signer from a Base64url-encoded raw private key.
+
+        :param private_raw: A private key point in uncompressed form.
+        :type private_raw: bytes
+
+        """
+        return cls.from_private_key(
+            _private_key(b64urldecode(private_raw)), strict=strict
+        )
+
+    @classmethod
+    def derive(cls, master_secret, tenant_id, strict=True):
+        """Build a compact signer from a key derived for `tenant_id`.
+
+        See `py_vapid.Vapid01.derive`, including how long `master_secret`
+        is cached.
+
+        :param master_secret: Secret shared by all tenants, at least 32 octets
+        :type master_secret: bytes or bytearray
+        :param tenant_id: Tenant identifier
+        :type tenant_id: str
+
+        """
+        return cls.from_private_key(
+            _derived_key(bytes(master_secret), tenant_id), strict=strict
+        )
+
+    @classmethod
+    def generate(cls, strict=True):
+        """Generate a new compact signer with a fresh key pair."""
+        return cls.from_private_key(
+            ec.generate_private_key(ec.SECP256R1(), default_backend()),
+            strict=strict,
+        )
+
+    @property
+    def private_key(self):
+        """The VAPID private ECDSA key"""
+        return _private_key(self.private_raw)
+
+    @property
+    def public_key(self):
+        """The VAPID public ECDSA key"""
+        return _public_key(self.public_raw)
+
+    @property
+    def application_server_key(self):
+        """The Base64url-encoded public key, as used by `PushManager`"""
+        return b64urlencode(self.public_raw)
+
+    def to_vapid(self):
+        """Return an equivalent, mutable `Vapid02` instance."""
+        return Vapid02(self.private_key, conf={"no-strict": not self.strict})
+
+    @profiled("sign")
+    def sign(self, claims):
+        """Generate an authorization token
+
+        :param claims: JSON object containing the JWT claims to use.
+        :type claims: dict
+        :returns: a hash containing the header fields to use in
+            the subscription update.
+        :rtype: dict
+
+        """
+        sig = sign(_check_claims(claims, strict=self.strict), self.private_key)
+        return {
+            "Authorization": "{schema} t={t},k={k}".format(
+                schema=self._schema, t=sig, k=self.application_server_key
+            )
+        }
+
+    verify = staticmethod(Vapid02.verify)
@@ -0,0 +1,88 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+
+class CryptoKey(object):
+    """A parsed Draft-01 `Crypto-Key` header.
+
+    The header is a comma separated list of entries, each a semicolon
+    separated list of `name=value` parameters, e.g.
+    `dh=BNg...;p256ecdsa=BOr...`. Values are kept verbatim, so parsing and
+    formatting a header returns the same string.
+
+    """
+
+    __slots__ = ("entries",)
+
+    def __init__(self, entries=None):
+        """Create a header from already split entries.
+
+        :param entries: list of entries, each a list of `(name, value)`
+        :type entries: list
+
+        """
+        self.entries = entries if entries is not None else []
+
+    @classmethod
+    def parse(cls, header):
+        """Parse a `Crypto-Key` header value.
+
+        :param header: The header value
+        :type header: str
+        :rtype: CryptoKey
+
+        """
+        entries = []
+        for entry in header.split(","):
+            params = []
+            for param in entry.split(";"):
+                name, _, value = param.strip().partition("=")
+                if name:
+                    params.append((name.strip(), value.strip()))
+            if params:
+                entries.append(params)
+        return cls(entries)
+
+    def get(self, name, default=None):
+        """Return the first value of parameter `name`, unquoted.
+
+        :param name: Parameter name, e.g. `p256ecdsa`
+        :type name: str
+
+        """
+        name = name.lower()
+        for entry in self.entries:
+            for pname, value in entry:
+                if pname.lower() == name:
+                    return value.strip('"')
+        return default
+
+    def add(self, name, value):
+        """Append a parameter to the last entry.
+
+        :param name: Parameter name
+        :type name: str
+        :param value: Parameter value
+        :type value: str
+
+        """
+        if not self.entries:
+            self.entries.append([])
+        self.entries[-1].append((name, value))
+        return self
+
+    def __bool__(self):
+        return bool(self.entries)
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def __str__(self):
+        return ",".join(
+            ";".join("{}={}".format(name, value) for name, value in entry)
+            for entry in self.entries
+        )
+
+    def __repr__(self):
+        return "CryptoKey({!r})".format(str(self))
@@ -5,6 +5,7 @@ from cryptography.exceptions import InvalidSignature
 from cryptography.hazmat.primitives.asymmetric import ec, utils
 from cryptography.hazmat.primitives import hashes
 
+from py_vapid.profiling import profiled, stage
 from py_vapid.utils import b64urldecode, b64urlencode, num_to_bytes
 
 
@@ -30,6 +31,7 @@ def extract_signature(auth):
     return payload, encoded
 
 
+@profiled("jwt.decode")
 def decode(token, key):
     """Decode a web token into an assertion dictionary
 
@@ -44,26 +46,51 @@ def decode(token, key):
 
     """
     try:
-        sig_material, signature = extract_signature(token)
-        dkey = b64urldecode(key.encode('utf8'))
-        pkey = ec.EllipticCurvePublicKey.from_encoded_point(
-            ec.SECP256R1(),
-            dkey,
-        )
-        pkey.verify(
-            signature,
-            sig_material,
-            ec.ECDSA(hashes.SHA256())
-        )
-        return json.loads(
-            b64urldecode(sig_material.split(b'.')[1]).decode('utf8')
-        )
+        with stage("extract_signature"):
+            sig_material, signature = extract_signature(token)
+        with stage("load_key"):
+            dkey = b64urldecode(key.encode('utf8'))
+            pkey = ec.EllipticCurvePublicKey.from_encoded_point(
+                ec.SECP256R1(),
+                dkey,
+            )
+        with stage("ecdsa"):
+            pkey.verify(
+                signature,
+                sig_material,
+                ec.ECDSA(hashes.SHA256())
+            )
+        with stage("json.loads"):
+            return json.loads(
+                b64urldecode(sig_material.split(b'.')[1]).decode('utf8')
+            )
     except InvalidSignature:
         raise
     except(ValueError, TypeError, binascii.Error):
         raise InvalidSignature()
 
 
+def signing_input(claims):
+    """Return the JWS header and claims segments that get signed.
+
+    :param claims: list of JWS claims
+    :type claims: dict
+
+    :return str
+
+    """
+    header = b64urlencode(b"""{"typ":"JWT","alg":"ES256"}""")
+    # Unfortunately, chrome seems to require the claims to be sorted.
+    with stage("json.dumps"):
+        claims = json.dumps(claims,
+                            separators=(',', ':'),
+                            sort_keys=True).encode('utf8')
+    with stage("b64urlencode"):
+        claims = b64urlencode(claims)
+    return "{}.{}".format(header, claims)
+
+
+@profiled("jwt.sign")
 def sign(claims, key):
     """Sign the claims
 
@@ -75,13 +102,10 @@ def sign(claims, key):
     :type algorithm: str
 
     """
-    header = b64urlencode(b"""{"typ":"JWT","alg":"ES256"}""")
-    # Unfortunately, chrome seems to require the claims to be sorted.
-    claims = b64urlencode(json.dumps(claims,
-                                     separators=(',', ':'),
-                                     sort_keys=True).encode('utf8'))
-    token = "{}.{}".format(header, claims)
-    rsig = key.sign(token.encode('utf8'), ec.ECDSA(hashes.SHA256()))
-    (r, s) = utils.decode_dss_signature(rsig)
-    sig = b64urlencode(num_to_bytes(r, 32) + num_to_bytes(s, 32))
+    token = signing_input(claims)
+    with stage("ecdsa"):
+        rsig = key.sign(token.encode('utf8'), ec.ECDSA(hashes.SHA256()))
+    with stage("encode_signature"):
+        (r, s) = utils.decode_dss_signature(rsig)
+        sig = b64urlencode(num_to_bytes(r, 32) + num_to_bytes(s, 32))
     return "{}.{}".format(token, sig)
@@ -0,0 +1,211 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import mmap
+import os
+import struct
+
+from py_vapid import VapidException
+from py_vapid.compact import CompactVapid
+from py_vapid.utils import b64urldecode, write_atomic
+
+MAGIC = b"VAPIDKS\x01"
+
+# tenant id length, tenant id (utf8, NUL padded), raw private scalar,
+# uncompressed public point.
+_RECORD = struct.Struct(">B64s32s65s")
+MAX_TENANT_ID = 64
+
+
+def _pack(tenant_id, signer):
+    tid = tenant_id.encode("utf8")
+    if not tid or len(tid) > MAX_TENANT_ID:
+        raise VapidException(
+            "Tenant id must be 1 to {} bytes long".format(MAX_TENANT_ID)
+        )
+    return _RECORD.pack(len(tid), tid, signer.private_raw, signer.public_raw)
+
+
+class VapidKeyStore(object):
+    """A single-file store of raw VAPID private keys for many tenants.
+
+    The file is a short header followed by fixed-size records, and is read
+    through `mmap`, so opening it costs one file descriptor no matter how
+    many tenants it holds. Lookups by tenant id or by public key go through
+    hash indexes built from one pass over the mapped records; no key
+    material is parsed until a signer is requested.
+
+    The store assumes a single writer. `rewrite` replaces the file by
+    renaming over it, so a second `VapidKeyStore` opened on the same path
+    keeps appending to the old, unlinked file and its new keys are lost.
+
+    """
+
+    def __init__(self, path, strict=True):
+        """Open (or create) the store at `path`.
+
+        :param path: Name of the store file
+        :type path: str
+        :param strict: `strict` flag for returned signers
+        :type strict: bool
+
+        """
+        self.path = path
+        self.strict = strict
+        self._file = None
+        self._map = None
+        if not os.path.isfile(path):
+            self._write_file(path, [])
+        self._open()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self._by_tenant)
+
+    def __contains__(self, tenant_id):
+        return tenant_id in self._by_tenant
+
+    def __iter__(self):
+        return iter(self._by_tenant)
+
+    def _open(self):
+        self._file = open(self.path, "r+b")
+        # mmap refuses empty files, so check the size before mapping.
+        if os.fstat(self._file.fileno()).st_size < len(MAGIC):
+            self.close()
+            raise VapidException(
+                "{} is not a VAPID key store".format(self.path)
+            )
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        if self._map[: len(MAGIC)] != MAGIC:
+            self.close()
+            raise VapidException(
+                "{} is not a VAPID key store".format(self.path)
+            )
+        body = len(self._map) - len(MAGIC)
+        if body % _RECORD.size:
+            self.close()
+            raise VapidException("{} is truncated".format(self.path))
+        self._by_tenant = {}
+        self._by_public = {}
+        for offset in range(len(MAGIC), len(self._map), _RECORD.size):
+            self._index(offset)
+
+    def _index(self, offset):
+        tlen, tid, _, public_raw = _RECORD.unpack_from(self._map, offset)
+        self._by_tenant[tid[:tlen].decode("utf8")] = offset
+        self._by_public[public_raw] = offset
+
+    def close(self):
+        """Release the mapping and the underlying file."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _signer(self, offset):
+        _, _, private_raw, public_raw = _RECORD.unpack_from(self._map, offset)
+        return CompactVapid(private_raw, public_raw, self.strict)
+
+    def get(self, tenant_id, default=None):
+        """Return the signer for `tenant_id`.
+
+        :param tenant_id: Tenant identifier
+        :type tenant_id: str
+        :rtype: py_vapid.compact.CompactVapid
+
+        """
+        offset = self._by_tenant.get(tenant_id)
+        if offset is None:
+            return default
+        return self._signer(offset)
+
+    def find(self, public_key):
+        """Return the signer owning a public key, or None.
+
+        :param public_key: Base64url-encoded or raw uncompressed public key
+        :type public_key: bytes or str
+
+        """
+        if isinstance(public_key, str):
+            public_key = public_key.encode("utf8")
+        if len(public_key) != 65:
+            public_key = b64urldecode(public_key)
+        offset = self._by_public.get(public_key)
+        if offset is None:
+            return None
+        return self._signer(offset)
+
+    def add(self, tenant_id, signer):
+        """Append a key for a new tenant.
+
+        :param tenant_id: Tenant identifier, at most 64 utf8 bytes
+        :type tenant_id: str
+        :param signer: Key to store
+        :type signer: py_vapid.compact.CompactVapid or py_vapid.Vapid01
+
+        """
+        if tenant_id in self._by_tenant:
+            raise VapidException("Tenant {} already stored".format(tenant_id))
+        if not isinstance(signer, CompactVapid):
+            signer = CompactVapid.from_vapid(signer)
+        record = _pack(tenant_id, signer)
+        offset = len(self._map)
+        self._map.close()
+        self._file.seek(offset)
+        self._file.write(record)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._index(offset)
+        return self._signer(offset)
+
+    def items(self):
+        """Iterate over `(tenant_id, signer)` pairs."""
+        for tenant_id, offset in list(self._by_tenant.items()):
+            yield tenant_id, self._signer(offset)
+
+    def rewrite(self, items):
+        """Atomically replace the whole store with `items`.
+
+        The new content is written to a temporary file next to the store,
+        synced, and renamed over it, so readers never see a partial store.
+
+        :param items: `(tenant_id, signer)` pairs
+        :type items: iterable
+
+        """
+        records = []
+        seen = set()
+        for tenant_id, signer in items:
+            if tenant_id in seen:
+                raise VapidException(
+                    "Tenant {} already stored".format(tenant_id)
+                )
+            seen.add(tenant_id)
+            if not isinstance(signer, CompactVapid):
+                signer = CompactVapid.from_vapid(signer)
+            records.append(_pack(tenant_id, signer))
+        self._write_file(self.path, records)
+        self.close()
+        self._open()
+
+    def remove(self, tenant_id):
+        """Drop a tenant, rewriting the store."""
+        if tenant_id not in self._by_tenant:
+            raise KeyError(tenant_id)
+        self.rewrite(
+            (tid, signer) for tid, signer in self.items() if tid != tenant_id
+        )
+
+    @staticmethod
+    def _write_file(path, records):
+        write_atomic(path, MAGIC + b"".join(records))
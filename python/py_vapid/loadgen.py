@@ -0,0 +1,126 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from py_vapid.compact import CompactVapid
+from py_vapid.pushserver import PushServiceStub
+from py_vapid.sender import PushSender
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    rank = max(0, int(round(pct / 100.0 * len(ordered))) - 1)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def run(url, senders, messages, claims, workers):
+    """Drive `senders` independent senders at `url`.
+
+    Each sender has its own key and delivers `messages` messages.
+
+    :returns: dict with the run's throughput and latency summary
+
+    """
+    latencies = []
+    statuses = {}
+
+    def drive(index):
+        vapid = CompactVapid.generate()
+        endpoint = "{}/push/{}".format(url.rstrip("/"), index)
+        with PushSender(vapid, claims, max_per_origin=workers,
+                        retries=1, backoff=0) as sender:
+            def one(_):
+                start = time.perf_counter()
+                try:
+                    status = sender.send(endpoint, b"").status
+                except Exception as exc:
+                    status = type(exc).__name__
+                return status, time.perf_counter() - start
+
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                return list(pool.map(one, range(messages)))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=senders) as pool:
+        for results in pool.map(drive, range(senders)):
+            for status, latency in results:
+                latencies.append(latency)
+                statuses[status] = statuses.get(status, 0) + 1
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "seconds": round(elapsed, 3),
+        "per_second": round(len(latencies) / elapsed, 1),
+        "statuses": dict((str(k), v) for k, v in statuses.items()),
+        "latency_ms": dict(
+            ("p{}".format(p), round(percentile(latencies, p) * 1000, 3))
+            for p in (50, 90, 99, 100)
+        ),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Drive VAPID signed push requests at a push service")
+    parser.add_argument('--url', help='push service base URL. If omitted, '
+                        'a local stand-in push service is started')
+    parser.add_argument('--senders', '-n', type=int, default=4,
+                        help='number of senders, each with its own key')
+    parser.add_argument('--messages', '-m', type=int, default=250,
+                        help='messages per sender')
+    parser.add_argument('--concurrency', '-c', type=int, default=4,
+                        help='in-flight requests per sender')
+    parser.add_argument('--sub', default="mailto:loadgen@example.com",
+                        help='"sub" claim to sign with')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='stand-in response delay in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='stand-in random extra delay in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of requests the stand-in rejects '
+                             'with a 503')
+    parser.add_argument('--json', help="dump as json",
+                        default=False, action="store_true")
+    args = parser.parse_args(argv)
+
+    claims = {"sub": args.sub}
+    server = None
+    url = args.url
+    if not url:
+        server = PushServiceStub(
+            latency=args.latency, jitter=args.jitter,
+            error_rate=args.error_rate).start()
+        url = server.origin
+    try:
+        report = run(url, args.senders, args.messages, claims,
+                     args.concurrency)
+    finally:
+        if server:
+            server.stop()
+    if server:
+        report["server"] = dict(server.stats)
+    if args.json:
+        print(json.dumps(report))
+        return report
+    print("{requests} requests in {seconds}s: {per_second} req/s".format(
+        **report))
+    print("status: " + ", ".join(
+        "{}={}".format(k, v) for k, v in sorted(report["statuses"].items())))
+    print("latency (ms): " + ", ".join(
+        "{}={}".format(k, v) for k, v in report["latency_ms"].items()))
+    if "server" in report:
+        print("server: " + ", ".join(
+            "{}={}".format(k, v) for k, v in sorted(report["server"].items())))
+    return report
+
+
+if __name__ == '__main__':
+    main()
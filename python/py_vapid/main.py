@@ -3,12 +3,20 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import argparse
+import datetime
 import os
 import json
+import sys
+import time
 
 from cryptography.hazmat.primitives import serialization
 
-from py_vapid import Vapid01, Vapid02, b64urlencode
+from py_vapid import Vapid01, Vapid02, VapidException, b64urlencode
+from py_vapid.bulk import generate_many
+from py_vapid.keystore import VapidKeyStore
+from py_vapid import profiling
+from py_vapid.presign import presign
+from py_vapid.utils import write_atomic
 
 
 def prompt(prompt):
@@ -20,6 +28,64 @@ def prompt(prompt):
         return raw_input(prompt)  # noqa: F821
 
 
+def import_keys(store_file, key_files):
+    with VapidKeyStore(store_file) as store:
+        for key_file in key_files:
+            if not os.path.isfile(key_file):
+                print("No {} file found.".format(key_file))
+                exit(1)
+            tenant_id = os.path.splitext(os.path.basename(key_file))[0]
+            if tenant_id in store:
+                print("Skipping {}: tenant {} already stored".format(
+                    key_file, tenant_id))
+                continue
+            store.add(tenant_id, Vapid02.from_file(key_file))
+            print("Imported {} as {}".format(key_file, tenant_id))
+
+
+def generate_batch(count, out_dir, out_format):
+    try:
+        records = generate_many(count)
+    except VapidException as exc:
+        print(exc)
+        exit(1)
+    if out_format == 'ndjson':
+        for record in records:
+            sys.stdout.write(json.dumps(record) + "\n")
+        return
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    width = len(str(count))
+    for i, record in enumerate(records):
+        prefix = os.path.join(out_dir, str(i).zfill(width))
+        write_atomic(prefix + "_private_key.pem",
+                     record['private_key'].encode('utf8'))
+        write_atomic(prefix + "_public_key.pem",
+                     record['public_key'].encode('utf8'), mode=0o644)
+    print("Generated {} key pairs in {}".format(count, out_dir))
+
+
+def parse_time(value):
+    if value is None:
+        return int(time.time())
+    try:
+        return int(value)
+    except ValueError:
+        return int(datetime.datetime.fromisoformat(value).timestamp())
+
+
+def presign_headers(vapid, args):
+    if not args.sign or not args.aud:
+        print("--presign needs a --sign claims file and --aud values")
+        exit(1)
+    claims = json.loads(open(args.sign).read())
+    presigned = presign(vapid, claims, args.aud, parse_time(args.send_at),
+                        args.window)
+    presigned.save(args.presign)
+    print("Saved {} headers, valid until {}, to {}".format(
+        len(presigned), presigned.exp, args.presign))
+
+
 def main():
     parser = argparse.ArgumentParser(description="VAPID tool")
     parser.add_argument('--sign', '-s', help='claims file to sign')
@@ -38,8 +104,56 @@ def main():
                         default=False, action="store_true")
     parser.add_argument('--private-key', '-k', help='private key pem file',
                         default="private_key.pem")
+    parser.add_argument('--count', '-n', type=int, default=None,
+                        help='generate this many key pairs in bulk')
+    parser.add_argument('--out', '-o', default='.',
+                        help='directory for --count PEM files')
+    parser.add_argument('--format', choices=['pem', 'ndjson'], default='pem',
+                        help='--count output: PEM file pairs in --out, or '
+                             'one JSON record per line on stdout')
+    parser.add_argument('--presign', metavar='OUT',
+                        help='sign the --sign claims for every --aud ahead '
+                             'of time and save the headers to OUT')
+    parser.add_argument('--aud', nargs='+', default=[],
+                        help='audiences to --presign for')
+    parser.add_argument('--send-at', default=None,
+                        help='--presign window start, as seconds since the '
+                             'epoch or an ISO 8601 date (default: now)')
+    parser.add_argument('--window', type=int, default=3600,
+                        help='--presign window length in seconds')
+    parser.add_argument('--profile', nargs='?', const='vapid-profile',
+                        metavar='PREFIX',
+                        help='time each sign/verify stage and write '
+                             'PREFIX.txt and PREFIX.folded '
+                             '(default prefix: vapid-profile)')
+    parser.add_argument('--store', help='tenant key store file',
+                        default="vapid_keys.store")
+    parser.add_argument('--import-keys', nargs='+', metavar='KEY_FILE',
+                        help='import PEM/DER private key files into the '
+                             '--store file, using each file name (minus '
+                             'extension) as the tenant id')
     args = parser.parse_args()
 
+    if args.profile:
+        profiler = profiling.enable()
+        try:
+            run(args)
+        finally:
+            profiling.disable()
+            profiler.write(args.profile)
+            sys.stderr.write(profiler.report())
+        return
+    run(args)
+
+
+def run(args):
+    if args.import_keys:
+        import_keys(args.store, args.import_keys)
+        return
+    if args.count is not None:
+        generate_batch(args.count, args.out, args.format)
+        return
+
     # Added to solve 2.7 => 3.* incompatibility
     Vapid = Vapid02
     if args.version1:
@@ -56,14 +170,18 @@ def main():
                 if answer == 'n':
                     print("Sorry, can't do much for you then.")
                     exit(1)
-        vapid = Vapid(conf=args)
+        vapid = Vapid(conf={"no-strict": args.no_strict})
         vapid.generate_keys()
         print("Generating private_key.pem")
         vapid.save_key('private_key.pem')
         print("Generating public_key.pem")
         vapid.save_public_key('public_key.pem')
     vapid = Vapid.from_file(args.private_key)
+    vapid.conf["no-strict"] = args.no_strict
     claim_file = args.sign
+    if args.presign:
+        presign_headers(vapid, args)
+        return
     result = dict()
     if args.applicationServerKey:
         raw_pub = vapid.public_key.public_bytes(
@@ -0,0 +1,157 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from py_vapid import VapidException
+from py_vapid.compact import CompactVapid
+from py_vapid.utils import write_atomic
+
+# RFC8292 3.2: `exp` MUST NOT be more than 24 hours from the time of the
+# request.
+MAX_WINDOW = 86400
+
+# Audiences signed per worker task.
+CHUNK_SIZE = 64
+
+
+class PresignedHeaders(object):
+    """VAPID headers signed ahead of time, keyed by `aud`.
+
+    Every header expires at the end of the send window, `exp`.
+
+    """
+
+    def __init__(self, start, exp, headers):
+        """Create a store from already signed headers.
+
+        :param start: Start of the send window, in seconds since the epoch
+        :type start: int
+        :param exp: End of the send window and `exp` of every token
+        :type exp: int
+        :param headers: Signed headers by `aud`
+        :type headers: dict
+
+        """
+        self.start = start
+        self.exp = exp
+        self.headers = headers
+
+    def __len__(self):
+        return len(self.headers)
+
+    def __contains__(self, aud):
+        return aud in self.headers
+
+    def get(self, aud, now=None):
+        """Return the headers for `aud`, or None outside the send window.
+
+        Headers are only handed out from `start` on: before that, their
+        `exp` may be more than the 24 hours ahead RFC8292 allows.
+
+        :param aud: The scheme, host and optional port of the push service
+        :type aud: str
+        :param now: Current time, defaults to `time.time()`
+        :type now: float
+        :rtype: dict
+
+        """
+        if now is None:
+            now = time.time()
+        if not self.start <= now < self.exp:
+            return None
+        return self.headers.get(aud)
+
+    def save(self, path):
+        """Atomically write the store to a JSON file.
+
+        :param path: File name
+        :type path: str
+
+        """
+        data = json.dumps(
+            {"start": self.start, "exp": self.exp, "headers": self.headers},
+            separators=(",", ":"),
+            sort_keys=True,
+        )
+        write_atomic(path, data.encode("utf8"))
+
+    @classmethod
+    def load(cls, path):
+        """Read a store written by `save`.
+
+        :param path: File name
+        :type path: str
+        :rtype: PresignedHeaders
+
+        """
+        with open(path, "r") as file:
+            data = json.load(file)
+        return cls(data["start"], data["exp"], data["headers"])
+
+
+def _sign_chunk(signer, claims, exp, audiences):
+    signed = {}
+    for aud in audiences:
+        aud_claims = dict(claims)
+        aud_claims["aud"] = aud
+        aud_claims["exp"] = exp
+        signed[aud] = signer.sign(aud_claims)
+    return signed
+
+
+def presign(vapid, claims, audiences, start, window=3600, workers=None):
+    """Sign headers for every audience of a future send window.
+
+    Each token's `exp` is the end of the window, so the headers can be
+    used for any request sent within it. Signing is spread across
+    processes. Headers are always in the RFC8292 `vapid` form.
+
+    :param vapid: Signer holding the private key
+    :type vapid: py_vapid.Vapid02 or py_vapid.compact.CompactVapid
+    :param claims: Base claims, at least `sub`
+    :type claims: dict
+    :param audiences: `aud` values that will be sent to
+    :type audiences: iterable
+    :param start: Start of the send window, in seconds since the epoch
+    :type start: int
+    :param window: Length of the send window in seconds, at most 24 hours
+    :type window: int
+    :param workers: Number of worker processes, defaults to the CPU count.
+        Use 1 to sign in the calling process.
+    :type workers: int
+    :rtype: PresignedHeaders
+
+    """
+    if not 0 < window <= MAX_WINDOW:
+        raise VapidException(
+            "Send window must be between 1 and {} seconds".format(MAX_WINDOW)
+        )
+    exp = int(start + window)
+    if exp <= time.time():
+        raise VapidException("Send window has already ended")
+    if not isinstance(vapid, CompactVapid):
+        vapid = CompactVapid.from_vapid(vapid)
+    audiences = sorted(set(audiences))
+    chunks = [
+        audiences[i:i + CHUNK_SIZE]
+        for i in range(0, len(audiences), CHUNK_SIZE)
+    ]
+    headers = {}
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            headers.update(_sign_chunk(vapid, claims, exp, chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_sign_chunk, vapid, claims, exp, chunk)
+                for chunk in chunks
+            ]
+            for future in futures:
+                headers.update(future.result())
+    return PresignedHeaders(int(start), exp, headers)
@@ -0,0 +1,138 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""Stage timing for the sign and verify hot paths.
+
+Set `VAPID_PROFILE` to a file prefix to time every stage of signing and
+verification for the life of the process. On exit, a text breakdown is
+written to `<prefix>.txt` and a flamegraph compatible collapsed stack file
+(self time in microseconds) to `<prefix>.folded`.
+
+When profiling is off, each instrumented call costs one extra check.
+
+"""
+
+import atexit
+import contextlib
+import functools
+import os
+import threading
+import time
+
+ENV_VAR = "VAPID_PROFILE"
+
+_NULL = contextlib.nullcontext()
+_active = None
+
+
+class Profiler(object):
+    """Accumulates wall time per nested stage."""
+
+    def __init__(self):
+        self.totals = {}
+        self.calls = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(name)
+        key = tuple(stack)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            with self._lock:
+                self.totals[key] = self.totals.get(key, 0.0) + elapsed
+                self.calls[key] = self.calls.get(key, 0) + 1
+
+    def self_times(self):
+        """Time spent in each stage outside its child stages."""
+        own = dict(self.totals)
+        for key, total in self.totals.items():
+            if len(key) > 1 and key[:-1] in own:
+                own[key[:-1]] -= total
+        return own
+
+    def collapsed(self):
+        """Return the stages in collapsed stack format, in microseconds."""
+        return "".join(
+            "{} {}\n".format(";".join(key), max(0, int(round(t * 1e6))))
+            for key, t in sorted(self.self_times().items())
+        )
+
+    def report(self):
+        """Return a human readable breakdown."""
+        roots = sum(t for key, t in self.totals.items() if len(key) == 1)
+        own = self.self_times()
+        lines = ["{:<40} {:>9} {:>11} {:>11} {:>6}".format(
+            "stage", "calls", "total ms", "self ms", "%")]
+        for key in sorted(self.totals):
+            lines.append("{:<40} {:>9} {:>11.3f} {:>11.3f} {:>6.1f}".format(
+                "  " * (len(key) - 1) + key[-1],
+                self.calls[key],
+                self.totals[key] * 1000,
+                own[key] * 1000,
+                100.0 * own[key] / roots if roots else 0.0,
+            ))
+        return "\n".join(lines) + "\n"
+
+    def write(self, prefix):
+        """Write `<prefix>.txt` and `<prefix>.folded`."""
+        with open(prefix + ".txt", "w") as file:
+            file.write(self.report())
+        with open(prefix + ".folded", "w") as file:
+            file.write(self.collapsed())
+
+
+def enable():
+    """Start collecting stage timings, returning the active profiler."""
+    global _active
+    if _active is None:
+        _active = Profiler()
+    return _active
+
+
+def disable():
+    """Stop collecting, returning the profiler that was active."""
+    global _active
+    profiler, _active = _active, None
+    return profiler
+
+
+def stage(name):
+    """Context manager timing the enclosed block as stage `name`."""
+    # Read once: another thread may disable() in between.
+    profiler = _active
+    if profiler is None:
+        return _NULL
+    return profiler.stage(name)
+
+
+def profiled(name):
+    """Decorator timing every call of the function as stage `name`."""
+    def wrap(func):
+        @functools.wraps(func)
+        def inner(*args, **kwargs):
+            profiler = _active
+            if profiler is None:
+                return func(*args, **kwargs)
+            with profiler.stage(name):
+                return func(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def _from_env():
+    prefix = os.environ.get(ENV_VAR)
+    if prefix:
+        profiler = enable()
+        atexit.register(profiler.write, prefix)
+
+
+_from_env()
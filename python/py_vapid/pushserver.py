@@ -0,0 +1,209 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import asyncio
+import collections
+import random
+import threading
+import time
+
+from cryptography.exceptions import InvalidSignature
+
+from py_vapid.crypto_key import CryptoKey
+from py_vapid.jwt import decode
+
+# RFC8292 3.2: `exp` MUST NOT be more than 24 hours from the time of the
+# request.
+MAX_EXP = 86400
+
+_REASONS = {
+    201: "Created",
+    400: "Bad Request",
+    401: "Unauthorized",
+    403: "Forbidden",
+    404: "Not Found",
+    429: "Too Many Requests",
+    503: "Service Unavailable",
+}
+
+
+def check_authorization(headers, origin=None):
+    """Validate the VAPID headers of a push request.
+
+    Both the RFC8292 `vapid t=...,k=...` and the Draft-01
+    `WebPush <token>` + `Crypto-Key: p256ecdsa=...` forms are accepted.
+
+    :param headers: Request headers, with lower case names
+    :type headers: dict
+    :param origin: Expected `aud`, if it should be checked
+    :type origin: str
+    :returns: the verified claims
+    :rtype: dict
+    :raises InvalidSignature: if the headers are missing or invalid, or
+        `exp` has passed or is more than 24 hours ahead
+
+    """
+    auth = headers.get("authorization", "")
+    schema, _, value = auth.partition(" ")
+    if schema.lower() == "vapid":
+        parts = dict(
+            kv.strip().split("=", 1) for kv in value.split(",") if "=" in kv
+        )
+        token, key = parts.get("t"), parts.get("k")
+    elif schema.lower() == "webpush":
+        token = value
+        key = CryptoKey.parse(headers.get("crypto-key", "")).get("p256ecdsa")
+    else:
+        raise InvalidSignature()
+    if not token or not key:
+        raise InvalidSignature()
+    claims = decode(token.strip(), key.strip())
+    if not isinstance(claims, dict):
+        raise InvalidSignature()
+    if origin and claims.get("aud") != origin:
+        raise InvalidSignature()
+    exp = claims.get("exp")
+    if not isinstance(exp, int) or isinstance(exp, bool):
+        raise InvalidSignature()
+    now = time.time()
+    if not now <= exp <= now + MAX_EXP:
+        raise InvalidSignature()
+    return claims
+
+
+class PushServiceStub(object):
+    """A local asyncio HTTP/1.1 server that plays the push service role.
+
+    Every `POST` must carry valid VAPID headers for this server's origin
+    and gets a `201`, or a `401` otherwise. Each response can be delayed by
+    `latency` seconds (plus up to `jitter`), and a fraction `error_rate`
+    of requests are answered with `error_status` and a `Retry-After` of
+    `retry_after` to exercise sender back-off. Verification runs on the
+    event loop, as it would on a single-threaded push service node.
+
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0,
+                 error_rate=0.0, error_status=503, retry_after=0,
+                 check_aud=True):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.check_aud = check_aud
+        self.stats = collections.Counter()
+        self._server = None
+        self._loop = None
+        self._thread = None
+
+    @property
+    def origin(self):
+        return "http://{}:{}".format(self.host, self.port)
+
+    async def start_async(self):
+        """Start listening on the running event loop."""
+        self._server = await asyncio.start_server(
+            self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop_async(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def start(self):
+        """Run the server on its own event loop in a background thread."""
+        self._loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self.start_async())
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        """Stop a server started with `start`."""
+        asyncio.run_coroutine_threadsafe(
+            self.stop_async(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request = await reader.readline()
+                if not request:
+                    break
+                method = request.split(b" ", 1)[0]
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length", 0))
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    # The body can't be skipped, so the connection can't
+                    # be reused either.
+                    self.stats["rejected"] += 1
+                    writer.write(self._response(400, {"Connection": "close"}))
+                    await writer.drain()
+                    break
+                if length:
+                    await reader.readexactly(length)
+                status, extra = self._respond(method, headers)
+                delay = self.latency + random.random() * self.jitter
+                if delay:
+                    await asyncio.sleep(delay)
+                writer.write(self._response(status, extra))
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _respond(self, method, headers):
+        if method != b"POST":
+            self.stats["rejected"] += 1
+            return 404, {}
+        if self.error_rate and random.random() < self.error_rate:
+            self.stats["errors"] += 1
+            return self.error_status, {"Retry-After": str(self.retry_after)}
+        try:
+            check_authorization(
+                headers, self.origin if self.check_aud else None)
+        except InvalidSignature:
+            self.stats["rejected"] += 1
+            return 401, {}
+        self.stats["accepted"] += 1
+        return 201, {"Location": "/m/{}".format(self.stats["accepted"])}
+
+    @staticmethod
+    def _response(status, headers):
+        lines = ["HTTP/1.1 {} {}".format(status, _REASONS.get(status, ""))]
+        headers = dict(headers, **{"Content-Length": "0"})
+        lines.extend("{}: {}".format(k, v) for k, v in headers.items())
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
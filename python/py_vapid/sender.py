@@ -0,0 +1,297 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import collections
+import email.utils
+import http.client
+import logging
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from py_vapid import VapidException
+
+# `headers` is the response's `http.client.HTTPMessage`, so lookups are
+# case-insensitive.
+PushResponse = collections.namedtuple(
+    "PushResponse", ["endpoint", "status", "headers", "body"]
+)
+
+# Errors raised when the server has closed an idle keep-alive connection.
+STALE_CONNECTION = (
+    http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+# Status codes worth retrying. Push services use 429 and 503 together with
+# `Retry-After` to ask senders to back off.
+RETRY_STATUS = frozenset([429, 500, 502, 503, 504])
+
+
+def _origin(endpoint):
+    parts = urlsplit(endpoint)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise VapidException("Invalid push endpoint {}".format(endpoint))
+    origin = "{}://{}".format(parts.scheme, parts.hostname)
+    if parts.port:
+        origin += ":{}".format(parts.port)
+    return origin
+
+
+def _retry_after(value, default):
+    """Convert a `Retry-After` header into a delay in seconds."""
+    if not value:
+        return default
+    try:
+        return max(0, int(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return default
+    return max(0, when - time.time())
+
+
+class _OriginPool(object):
+    """Keep-alive connections to a single origin.
+
+    At most `size` requests are in flight at once; idle connections are
+    kept for reuse.
+
+    """
+
+    def __init__(self, origin, size, timeout, ssl_context):
+        parts = urlsplit(origin)
+        self.secure = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self.slots = threading.BoundedSemaphore(size)
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def acquire(self, fresh=False):
+        """Return a connection, and whether it is a reused idle one."""
+        self.slots.acquire()
+        if not fresh:
+            with self.lock:
+                if self.idle:
+                    return self.idle.pop(), True
+        if self.secure:
+            return http.client.HTTPSConnection(
+                self.host, self.port, timeout=self.timeout,
+                context=self.ssl_context), False
+        return http.client.HTTPConnection(
+            self.host, self.port, timeout=self.timeout), False
+
+    def release(self, conn, reuse=True):
+        if reuse:
+            with self.lock:
+                self.idle.append(conn)
+        else:
+            conn.close()
+        self.slots.release()
+
+    def close(self):
+        with self.lock:
+            for conn in self.idle:
+                conn.close()
+            self.idle = []
+
+
+class PushSender(object):
+    """Deliver WebPush messages with VAPID headers over pooled connections.
+
+    The `aud` claim is derived from each endpoint's origin and the signed
+    headers are cached per origin until shortly before they expire, so a
+    burst to one push service costs a single signature. Requests to the
+    same origin share keep-alive connections, bounded by
+    `max_per_origin`. Responses asking the sender to back off (429, 5xx)
+    are retried after the `Retry-After` delay, unless it is longer than
+    `max_retry_delay`.
+
+    Only HTTP/1.1 is supported, through `http.client`.
+
+    """
+
+    def __init__(self, vapid, claims, max_per_origin=8, retries=3,
+                 timeout=30, header_ttl=12 * 3600, backoff=1.0,
+                 max_retry_delay=60, ssl_context=None, presigned=None):
+        """Create a sender signing with `vapid`.
+
+        :param vapid: Signer used for the `Authorization` header
+        :type vapid: py_vapid.Vapid02 or py_vapid.compact.CompactVapid
+        :param claims: Base claims, at least `sub`. `aud` and `exp` are
+            filled in per origin.
+        :type claims: dict
+        :param max_per_origin: Concurrent requests allowed per origin
+        :type max_per_origin: int
+        :param retries: Retries after the first attempt
+        :type retries: int
+        :param timeout: Socket timeout in seconds
+        :type timeout: float
+        :param header_ttl: Lifetime of signed headers, in seconds
+        :type header_ttl: int
+        :param backoff: Delay before a retry without `Retry-After`
+        :type backoff: float
+        :param max_retry_delay: Longest delay to wait before a retry. A
+            response asking for a longer one is returned as is.
+        :type max_retry_delay: float
+        :param ssl_context: Context for `https` origins
+        :type ssl_context: ssl.SSLContext
+        :param presigned: Headers signed ahead of time, used while valid
+            instead of signing
+        :type presigned: py_vapid.presign.PresignedHeaders
+
+        """
+        self.vapid = vapid
+        self.claims = claims
+        self.max_per_origin = max_per_origin
+        self.retries = retries
+        self.timeout = timeout
+        self.header_ttl = header_ttl
+        self.backoff = backoff
+        self.max_retry_delay = max_retry_delay
+        self.ssl_context = ssl_context or ssl.create_default_context()
+        self.presigned = presigned
+        self._headers = {}
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            pool.close()
+
+    def vapid_headers(self, origin):
+        """Return (cached) VAPID headers for `origin`.
+
+        :param origin: scheme, host and optional port of the push service
+        :type origin: str
+        :rtype: dict
+
+        """
+        now = time.time()
+        if self.presigned is not None:
+            headers = self.presigned.get(origin, now)
+            if headers:
+                return headers
+        cached = self._headers.get(origin)
+        # Refresh with a tenth of the lifetime left, so a header is never
+        # sent just as it expires.
+        if cached and cached[0] - self.header_ttl / 10 > now:
+            return cached[1]
+        claims = dict(self.claims)
+        claims["aud"] = origin
+        claims["exp"] = int(now) + self.header_ttl
+        headers = self.vapid.sign(claims)
+        self._headers[origin] = (claims["exp"], headers)
+        return headers
+
+    def _pool(self, origin):
+        with self._lock:
+            pool = self._pools.get(origin)
+            if pool is None:
+                pool = self._pools[origin] = _OriginPool(
+                    origin, self.max_per_origin, self.timeout,
+                    self.ssl_context)
+            return pool
+
+    def _request(self, pool, path, body, headers, fresh=False):
+        conn, reused = pool.acquire(fresh)
+        try:
+            conn.request("POST", path, body=body, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+        except STALE_CONNECTION:
+            pool.release(conn, reuse=False)
+            if not reused:
+                raise
+            # The server closed the idle connection; try again right away
+            # on a new one, without using up a retry.
+            return self._request(pool, path, body, headers, fresh=True)
+        except Exception:
+            pool.release(conn, reuse=False)
+            raise
+        pool.release(conn, reuse=not response.will_close)
+        return response.status, response.headers, data
+
+    def send(self, endpoint, data=None, headers=None, ttl=0):
+        """Deliver one message to a subscription endpoint.
+
+        :param endpoint: The subscription `endpoint` URL
+        :type endpoint: str
+        :param data: Already encrypted payload, if any
+        :type data: bytes
+        :param headers: Extra headers, e.g. `Content-Encoding`
+        :type headers: dict
+        :param ttl: Push message `TTL` in seconds
+        :type ttl: int
+        :rtype: PushResponse
+
+        """
+        origin = _origin(endpoint)
+        parts = urlsplit(endpoint)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        req_headers = {"TTL": str(ttl)}
+        req_headers.update(headers or {})
+        for name, value in self.vapid_headers(origin).items():
+            # Draft-01 signers append their key to any existing Crypto-Key
+            if name == "Crypto-Key" and name in req_headers:
+                value = "{};{}".format(req_headers[name], value)
+            req_headers[name] = value
+        pool = self._pool(origin)
+        attempt = 0
+        while True:
+            try:
+                status, resp_headers, body = self._request(
+                    pool, path, data, req_headers)
+            except (OSError, http.client.HTTPException) as exc:
+                if attempt >= self.retries:
+                    raise
+                logging.info("Push to %s failed: %r, retrying", origin, exc)
+                delay = self.backoff
+            else:
+                delay = _retry_after(
+                    resp_headers.get("Retry-After"), self.backoff)
+                if (status not in RETRY_STATUS or attempt >= self.retries
+                        or delay > self.max_retry_delay):
+                    return PushResponse(endpoint, status, resp_headers, body)
+            attempt += 1
+            time.sleep(delay)
+
+    def send_many(self, messages, workers=32):
+        """Deliver many messages concurrently.
+
+        :param messages: `endpoint` strings, or `(endpoint, data, headers)`
+            tuples
+        :type messages: iterable
+        :param workers: Total concurrent requests across all origins
+        :type workers: int
+        :returns: list of `PushResponse`, or the raised exception, in the
+            order of `messages`
+
+        """
+        def deliver(message):
+            if isinstance(message, str):
+                message = (message,)
+            try:
+                return self.send(*message)
+            except Exception as exc:
+                return exc
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(deliver, messages))
@@ -1,14 +1,35 @@
+import asyncio
 import binascii
 import base64
 import copy
+import http.client
 import os
 import json
+import shutil
+import sys
+import tempfile
+import threading
+import time
 import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from cryptography.hazmat.primitives import serialization
 from mock import patch, Mock
 
-from py_vapid import Vapid01, Vapid02, VapidException, _check_sub
-from py_vapid.jwt import decode
+from py_vapid import (
+    Vapid01, Vapid02, VapidException, _check_sub, clear_derive_cache)
+from py_vapid.bulk import derive_many, generate_many
+from py_vapid.compact import CompactVapid
+from py_vapid.crypto_key import CryptoKey
+from py_vapid.jwt import decode, sign as jwt_sign
+from py_vapid.keystore import VapidKeyStore
+from py_vapid.loadgen import main as loadgen_main
+from py_vapid.main import main as vapid_main
+from py_vapid.presign import PresignedHeaders, presign
+from py_vapid import profiling
+from py_vapid import vectors
+from py_vapid.pushserver import PushServiceStub, check_authorization
+from py_vapid.sender import PushSender
+from py_vapid.utils import write_atomic
 
 TEST_KEY_PRIVATE_DER = """
 MHcCAQEEIPeN1iAipHbt8+/KZ2NIF8NeN24jqAmnMLFZEMocY8RboAoGCCqGSM49
@@ -47,6 +68,9 @@ TEST_KEY_PUBLIC_RAW = (
     "pXSfRk5JQTOcahMLjzO1bkHMoiw4b6L7YTyF8foLEEU"
     ).strip('=').encode('utf8')
 
+VECTORS = os.path.join(os.path.dirname(__file__), '..', '..', '..',
+                       'test-vectors', 'vapid.ndjson')
+
 
 def setup_module(self):
     with open('/tmp/private', 'w') as ff:
@@ -97,6 +121,85 @@ class VapidTestCase(unittest.TestCase):
         assert v.public_key
         assert v.private_key
 
+    def test_generate_many(self):
+        for workers in (1, 2):
+            records = list(generate_many(5, workers=workers, chunk_size=2))
+            assert len(records) == 5
+            assert len(set(r['applicationServerKey'] for r in records)) == 5
+            for record in records:
+                v = Vapid02.from_pem(record['private_key'].encode())
+                assert v.public_pem().decode() == record['public_key']
+                assert CompactVapid.from_vapid(v).application_server_key == (
+                    record['applicationServerKey'])
+        # More chunks than the in-flight limit of two per worker
+        assert len(list(generate_many(9, workers=2, chunk_size=1))) == 9
+        assert list(generate_many(0)) == []
+        self.assertRaises(VapidException, generate_many, -1)
+        self.assertRaises(VapidException, generate_many, 3, chunk_size=0)
+
+    def test_main_count(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        out = os.path.join(tmp, 'keys')
+        self.run_main('--count', '3', '--out', out)
+        files = sorted(os.listdir(out))
+        assert files == ['{}_{}_key.pem'.format(i, kind)
+                         for i in range(3)
+                         for kind in ('private', 'public')]
+        v = Vapid02.from_file(os.path.join(out, '1_private_key.pem'))
+        assert v.public_pem() == open(
+            os.path.join(out, '1_public_key.pem'), 'rb').read()
+
+        with patch('sys.stdout') as stdout:
+            self.run_main('--count', '2', '--format', 'ndjson')
+        lines = [call[0][0] for call in stdout.write.call_args_list]
+        records = [json.loads(line) for line in lines]
+        assert len(records) == 2
+        for record in records:
+            assert set(record) == set(
+                ['private_key', 'public_key', 'applicationServerKey'])
+
+        with patch('sys.stdout'):
+            self.assertRaises(SystemExit, self.run_main, '--count', '-1')
+
+    def test_derive(self):
+        master = b'\x00' * 32
+        v = Vapid02.derive(master, 'tenant-1')
+        # Known answer; changing the derivation changes every tenant's key
+        assert CompactVapid.from_vapid(v).application_server_key == (
+            "BH4Q1TbSmhcjONggqIRHETWYgaPNa3yTdBgWVa1gOLUoQKg9paOJrnCZuM95LL2"
+            "JFPaVyRh6BoPmi4mdl56IxYA")
+        assert Vapid02.derive(master, 'tenant-1').private_key is v.private_key
+        assert Vapid01.derive(master, 'tenant-2').public_pem() != (
+            v.public_pem())
+        assert Vapid02.derive(b'\x01' * 32, 'tenant-1').public_pem() != (
+            v.public_pem())
+        assert CompactVapid.derive(master, 'tenant-1') == (
+            CompactVapid.from_vapid(v))
+        claims = {"aud": "https://example.com",
+                  "sub": "mailto:admin@example.com"}
+        assert Vapid02.verify(v.sign(claims)['Authorization'])
+        self.assertRaises(VapidException, Vapid02.derive, b'short', 't')
+        assert Vapid02.derive(bytearray(master), 'tenant-1').private_key is (
+            v.private_key)
+        assert CompactVapid.derive(bytearray(master), 'tenant-1') == (
+            CompactVapid.from_vapid(v))
+        clear_derive_cache()
+        assert Vapid02.derive(master, 'tenant-1').private_key is not (
+            v.private_key)
+
+        tenants = ['tenant-{}'.format(i) for i in range(7)]
+        for workers in (1, 2):
+            derived = list(derive_many(master, tenants, workers=workers,
+                                       chunk_size=3))
+            assert [t for t, _ in derived] == tenants
+            for tenant, key in derived:
+                assert key == CompactVapid.derive(
+                    master, tenant).application_server_key
+        self.assertRaises(VapidException, derive_many, b'short', tenants)
+        self.assertRaises(VapidException, derive_many, master, tenants,
+                          chunk_size=0)
+
     def test_private_key(self):
         v = Vapid01()
         self.assertRaises(VapidException,
@@ -113,6 +216,61 @@ class VapidTestCase(unittest.TestCase):
         v.save_key("/tmp/p2")
         os.unlink("/tmp/p2")
 
+    def test_save_key_atomic(self):
+        v = Vapid01()
+        v.generate_keys()
+        v.save_key("/tmp/p2")
+        assert os.stat("/tmp/p2").st_mode & 0o777 == 0o600
+        assert not write_atomic("/tmp/p2", b"other", overwrite=False)
+        assert Vapid01.from_file("/tmp/p2").private_pem() == v.private_pem()
+        assert not [f for f in os.listdir("/tmp") if f.startswith(".vapid-")]
+        os.unlink("/tmp/p2")
+
+    def test_write_atomic_fsyncs_dir(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        path = os.path.join(tmp, 'key')
+        with patch("py_vapid.utils._fsync_dir") as fsync_dir:
+            assert write_atomic(path, b"first")
+            fsync_dir.assert_called_once_with(tmp)
+            assert not write_atomic(path, b"second", overwrite=False)
+            assert fsync_dir.call_count == 1
+            os.unlink(path)
+            assert write_atomic(path, b"third", overwrite=False)
+            assert fsync_dir.call_count == 2
+        # Unpatched, on a real directory
+        assert write_atomic(path, b"fourth")
+        assert open(path, "rb").read() == b"fourth"
+
+    @patch("os.link", side_effect=OSError("hard links not supported"))
+    def test_write_atomic_no_link(self, mm):
+        assert write_atomic("/tmp/p4", b"first", overwrite=False)
+        assert not write_atomic("/tmp/p4", b"second", overwrite=False)
+        assert open("/tmp/p4", "rb").read() == b"first"
+        assert os.stat("/tmp/p4").st_mode & 0o777 == 0o600
+        assert not [f for f in os.listdir("/tmp") if f.startswith(".vapid-")]
+        os.unlink("/tmp/p4")
+
+    @patch("py_vapid.write_atomic", return_value=False)
+    def test_from_file_race(self, mm):
+        # Another worker created the key between our check and our write.
+        with patch("os.path.isfile", return_value=False):
+            v = Vapid01.from_file("/tmp/private")
+        self.check_keys(v)
+
+    def test_async_file(self):
+        async def run():
+            v = await Vapid02.afrom_file("/tmp/private")
+            self.check_keys(v)
+            await v.asave_key("/tmp/p3")
+            await v.asave_public_key("/tmp/p3.pub")
+            return await Vapid02.afrom_file("/tmp/p3")
+
+        self.check_keys(asyncio.run(run()))
+        assert open("/tmp/p3.pub").read() == TEST_KEY_PUBLIC_PEM
+        os.unlink("/tmp/p3")
+        os.unlink("/tmp/p3.pub")
+
     def test_same_public_key(self):
         v = Vapid01()
         v.generate_keys()
@@ -155,6 +313,42 @@ class VapidTestCase(unittest.TestCase):
             auth=result['Authorization']
         )
 
+    def test_crypto_key(self):
+        header = 'keyid="p256dh";dh=BDgA,p256ecdsa=BBCc;x=1'
+        ck = CryptoKey.parse(header)
+        assert str(ck) == header
+        assert ck.get('keyid') == 'p256dh'
+        assert ck.get('P256ECDSA') == 'BBCc'
+        assert 'dh' in ck
+        assert 'nope' not in ck
+        assert str(CryptoKey().add('dh', 'abc')) == 'dh=abc'
+
+        v = Vapid01.from_string(TEST_KEY_PRIVATE_DER)
+        claims = {"aud": "https://example.com",
+                  "sub": "mailto:admin@example.com"}
+        result = v.sign(claims, CryptoKey.parse("dh=abc"))
+        assert result['Crypto-Key'] == (
+            'dh=abc;p256ecdsa=' + TEST_KEY_PUBLIC_RAW.decode())
+        assert Vapid01.verify(key=result['Crypto-Key'],
+                              auth=result['Authorization'])
+        assert Vapid01.verify(key=CryptoKey.parse(result['Crypto-Key']),
+                              auth=result['Authorization'])
+        self.assertRaises(VapidException,
+                          Vapid01.verify,
+                          key=CryptoKey.parse('dh=abc'),
+                          auth=result['Authorization'])
+        # A header without p256ecdsa is still parsed as a header
+        self.assertRaises(VapidException,
+                          Vapid01.verify,
+                          key='dh=abc',
+                          auth=result['Authorization'])
+        assert not CryptoKey()
+        result = v.sign(claims, CryptoKey())
+        assert result['Crypto-Key'] == (
+            'p256ecdsa=' + TEST_KEY_PUBLIC_RAW.decode())
+        assert Vapid01.verify(key=TEST_KEY_PUBLIC_RAW.decode() + '=',
+                              auth=result['Authorization'])
+
     def test_sign_02(self):
         v = Vapid02.from_file("/tmp/private")
         claims = {"aud": "https://example.com",
@@ -189,6 +383,381 @@ class VapidTestCase(unittest.TestCase):
         assert ' t=' in auth
         assert ',k=' in auth
 
+    def test_compact(self):
+        v = CompactVapid.from_raw(TEST_KEY_PRIVATE_RAW)
+        self.check_keys(v)
+        assert v.application_server_key == TEST_KEY_PUBLIC_RAW.decode()
+        assert len(v.private_raw) == 32
+        assert len(v.public_raw) == 65
+        assert not hasattr(v, '__dict__')
+        self.assertRaises(AttributeError, setattr, v, 'strict', False)
+        assert v == CompactVapid.from_vapid(Vapid02.from_file("/tmp/private"))
+        assert hash(v) == hash(CompactVapid.from_raw(TEST_KEY_PRIVATE_RAW))
+        assert v != tuple(v)
+        assert tuple(v) != v
+        assert 'private_raw' not in repr(v)
+        assert repr(v) == (
+            "CompactVapid(application_server_key={!r}, strict=True)".format(
+                TEST_KEY_PUBLIC_RAW.decode()))
+        self.check_keys(v.to_vapid())
+        result = v.sign({"aud": "https://example.com",
+                         "sub": "mailto:admin@example.com"})
+        assert result['Authorization'].endswith(
+            ',k=' + TEST_KEY_PUBLIC_RAW.decode())
+        assert CompactVapid.verify(result['Authorization'])
+        assert Vapid02.verify(result['Authorization'])
+        self.assertRaises(VapidException,
+                          v.sign,
+                          {"sub": "foo", "aud": "http://localhost:8000"})
+        lax = CompactVapid.generate(strict=False)
+        assert lax.sign({"sub": "foo", "aud": "http://localhost:8000"})
+
+    def test_keystore(self):
+        path = '/tmp/vapid.store'
+        if os.path.exists(path):
+            os.unlink(path)
+        with VapidKeyStore(path) as store:
+            assert len(store) == 0
+            store.add('alpha', Vapid02.from_file("/tmp/private"))
+            beta = store.add('beta', CompactVapid.generate())
+            self.assertRaises(VapidException,
+                              store.add, 'alpha', beta)
+            self.assertRaises(VapidException,
+                              store.add, 'x' * 65, beta)
+        with VapidKeyStore(path) as store:
+            assert sorted(store) == ['alpha', 'beta']
+            self.check_keys(store.get('alpha'))
+            assert store.get('gamma') is None
+            assert store.find(TEST_KEY_PUBLIC_RAW) == store.get('alpha')
+            assert store.find(beta.public_raw) == beta
+            store.remove('alpha')
+            assert 'alpha' not in store
+            assert store.get('beta') == beta
+            store.rewrite([('gamma', beta)])
+            assert list(store) == ['gamma']
+            self.assertRaises(VapidException,
+                              store.rewrite, [('a', beta), ('a', beta)])
+            assert list(store) == ['gamma']
+        assert os.path.getsize(path) == 8 + 162
+        os.unlink(path)
+        with open(path, 'wb') as ff:
+            ff.write(b'garbage')
+        self.assertRaises(VapidException, VapidKeyStore, path)
+        os.unlink(path)
+        open(path, 'wb').close()
+        self.assertRaises(VapidException, VapidKeyStore, path)
+        os.unlink(path)
+
+    def test_sender(self):
+        seen = []
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                seen.append((self.client_address, self.path,
+                             self.headers['Authorization'], body))
+                if len(seen) == 1:
+                    self.send_response(429)
+                    self.send_header('Retry-After', '0')
+                else:
+                    self.send_response(201)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        endpoint = 'http://127.0.0.1:{}/push/'.format(server.server_port)
+        v = Vapid02.from_file("/tmp/private")
+        try:
+            with PushSender(v, {"sub": "mailto:admin@example.com"},
+                            max_per_origin=1) as sender:
+                with patch.object(v, 'sign', wraps=v.sign) as sign:
+                    result = sender.send(endpoint + 'a', b'data')
+                    results = sender.send_many(
+                        [endpoint + 'b', (endpoint + 'c', b'x', {})])
+                    assert sign.call_count == 1
+        finally:
+            server.shutdown()
+            server.server_close()
+        assert result.status == 201
+        assert [r.status for r in results] == [201, 201]
+        assert [s[1] for s in seen] == ['/push/a', '/push/a',
+                                        '/push/b', '/push/c']
+        assert seen[0][3] == b'data'
+        # One keep-alive connection served every request
+        assert len(set(s[0] for s in seen)) == 1
+        assert Vapid02.verify(seen[0][2])
+        t = seen[0][2].split(' t=')[1].split(',')[0]
+        claims = decode(t, TEST_KEY_PUBLIC_RAW.decode())
+        assert claims['aud'] == 'http://127.0.0.1:{}'.format(
+            server.server_port)
+
+    def test_presign(self):
+        v = Vapid02.from_file("/tmp/private")
+        claims = {"sub": "mailto:admin@example.com"}
+        start = int(time.time()) + 60
+        auds = ["https://push{}.example.com".format(i) for i in range(70)]
+        serial = presign(v, claims, auds, start, window=600, workers=1)
+        parallel = presign(v, claims, auds, start, window=600, workers=2)
+        assert len(serial) == len(parallel) == 70
+        assert serial.exp == start + 600
+        for aud in auds:
+            auth = parallel.headers[aud]['Authorization']
+            assert Vapid02.verify(auth)
+            t = auth.split(' t=')[1].split(',')[0]
+            assert decode(t, TEST_KEY_PUBLIC_RAW.decode()) == dict(
+                claims, aud=aud, exp=start + 600)
+        assert serial.get(auds[0], now=start + 600) is None
+        assert serial.get(auds[0], now=start - 1) is None
+        assert serial.get(auds[0], now=start) is not None
+        serial.save('/tmp/presigned.json')
+        loaded = PresignedHeaders.load('/tmp/presigned.json')
+        os.unlink('/tmp/presigned.json')
+        assert loaded.headers == serial.headers
+        assert loaded.exp == serial.exp
+        self.assertRaises(VapidException, presign, v, claims, auds,
+                          start, window=86401)
+        self.assertRaises(VapidException, presign, v, claims, auds,
+                          start - 7200, window=3600)
+        self.assertRaises(VapidException, presign, v, claims, ["bogus"],
+                          start, workers=1)
+
+        with PushServiceStub() as server:
+            presigned = presign(v, claims, [server.origin], start)
+            with PushSender(v, claims, presigned=presigned) as sender:
+                # The window has not started yet, so headers are signed live
+                with patch.object(v, 'sign', wraps=v.sign) as sign:
+                    assert sender.send(server.origin + '/a').status == 201
+                    assert sign.called
+            presigned = presign(v, claims, [server.origin], time.time())
+            with PushSender(v, claims, presigned=presigned) as sender:
+                with patch.object(v, 'sign') as sign:
+                    assert sender.send(server.origin + '/a').status == 201
+                    assert not sign.called
+
+    def test_main_presign(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        claims = os.path.join(tmp, 'claims.json')
+        out = os.path.join(tmp, 'presigned.json')
+        with open(claims, 'w') as file:
+            json.dump({"sub": "mailto:admin@example.com"}, file)
+        now = int(time.time())
+        with patch('sys.stdout'):
+            self.run_main('-k', '/tmp/private', '--sign', claims,
+                          '--presign', out, '--aud', 'https://a.example.com',
+                          'https://b.example.com',
+                          '--send-at', str(now), '--window', '600')
+        loaded = PresignedHeaders.load(out)
+        assert loaded.start == now
+        assert loaded.exp == now + 600
+        assert sorted(loaded.headers) == ['https://a.example.com',
+                                          'https://b.example.com']
+        assert Vapid02.verify(
+            loaded.get('https://a.example.com')['Authorization'])
+
+    def test_sender_retry_limits(self):
+        seen = []
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                seen.append(self.client_address)
+                if self.path == '/busy':
+                    self.send_response(503)
+                    self.send_header('Retry-After', '86400')
+                elif self.path == '/lower':
+                    self.send_response(503)
+                    self.send_header('retry-after', '86400')
+                else:
+                    self.send_response(201)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                # Drop the keep-alive connection without telling the client
+                self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        endpoint = 'http://127.0.0.1:{}/'.format(server.server_port)
+        try:
+            with PushSender(Vapid02.from_file("/tmp/private"),
+                            {"sub": "mailto:admin@example.com"},
+                            retries=0, backoff=30) as sender:
+                start = time.time()
+                assert sender.send(endpoint + 'a').status == 201
+                # The pooled connection is stale by now, and no retries
+                # are allowed: it must be replaced transparently.
+                assert sender.send(endpoint + 'b').status == 201
+                sender.retries = 3
+                response = sender.send(endpoint + 'busy')
+                assert response.status == 503
+                assert response.headers['Retry-After'] == '86400'
+                response = sender.send(endpoint + 'lower')
+                assert response.status == 503
+                assert response.headers['Retry-After'] == '86400'
+                assert time.time() - start < 5
+        finally:
+            server.shutdown()
+            server.server_close()
+        assert len(seen) == 4
+
+    def test_push_service_stub(self):
+        claims = {"sub": "mailto:admin@example.com"}
+        with PushServiceStub(error_rate=0.5) as server:
+            with PushSender(Vapid02.from_file("/tmp/private"), claims,
+                            backoff=0, retries=20) as sender:
+                assert sender.send(server.origin + '/a').status == 201
+            with PushSender(Vapid01.from_file("/tmp/private"), claims,
+                            backoff=0, retries=20) as sender:
+                assert sender.send(server.origin + '/b', headers={
+                    'Crypto-Key': 'dh=abcd'}).status == 201
+            server.error_rate = 0
+            bad_aud = dict(claims, aud="https://example.com")
+            with PushSender(Vapid02.from_file("/tmp/private"), claims,
+                            retries=0) as sender:
+                sender._headers[server.origin] = (
+                    2 ** 40, sender.vapid.sign(bad_aud))
+                assert sender.send(server.origin + '/c').status == 401
+        assert server.stats['accepted'] == 2
+        assert server.stats['rejected'] == 1
+
+    def test_push_service_stub_bad_requests(self):
+        from cryptography.exceptions import InvalidSignature
+        v = Vapid02.from_file("/tmp/private")
+        key = TEST_KEY_PUBLIC_RAW.decode()
+
+        def auth(payload):
+            return {"authorization": "vapid t={},k={}".format(
+                jwt_sign(payload, v.private_key), key)}
+
+        good = {"aud": "http://localhost", "sub": "mailto:a@example.com",
+                "exp": int(time.time()) + 60}
+        assert check_authorization(auth(good), "http://localhost") == good
+        for payload in ([1], "x", dict(good, exp="soon"),
+                        dict(good, exp=True), dict(good, exp=1),
+                        dict(good, exp=int(time.time()) + 86400 + 60),
+                        {"aud": "http://localhost"}):
+            self.assertRaises(InvalidSignature, check_authorization,
+                              auth(payload))
+
+        with PushServiceStub() as server:
+            conn = http.client.HTTPConnection('127.0.0.1', server.port)
+            conn.request('POST', '/a', headers=auth([1]))
+            response = conn.getresponse()
+            response.read()
+            assert response.status == 401
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', server.port)
+            conn.putrequest('POST', '/a')
+            conn.putheader('Content-Length', 'lots')
+            conn.endheaders()
+            response = conn.getresponse()
+            response.read()
+            assert response.status == 400
+            conn.close()
+            with PushSender(v, {"sub": "mailto:a@example.com"},
+                            header_ttl=48 * 3600, retries=0) as sender:
+                assert sender.send(server.origin + '/a').status == 401
+        assert server.stats['rejected'] == 3
+
+    def test_loadgen(self):
+        report = loadgen_main(['-n', '2', '-m', '5', '--json'])
+        assert report['requests'] == 10
+        assert report['statuses'] == {'201': 10}
+        assert report['server'] == {'accepted': 10}
+
+    def test_profiling(self):
+        v = Vapid02.from_file("/tmp/private")
+        claims = {"aud": "https://example.com",
+                  "sub": "mailto:admin@example.com"}
+        profiler = profiling.enable()
+        try:
+            assert Vapid02.verify(v.sign(claims)['Authorization'])
+        finally:
+            assert profiling.disable() is profiler
+        v.sign(claims)
+        assert profiler.calls[('sign',)] == 1
+        for key in [('sign', '_base_sign'),
+                    ('sign', 'jwt.sign', 'json.dumps'),
+                    ('sign', 'jwt.sign', 'b64urlencode'),
+                    ('sign', 'jwt.sign', 'ecdsa'),
+                    ('verify', 'verify_token', 'ecdsa')]:
+            assert key in profiler.totals
+        folded = profiler.collapsed().splitlines()
+        assert 'sign;jwt.sign;ecdsa' in [line.split()[0] for line in folded]
+        assert all(line.split()[1].isdigit() for line in folded)
+        assert 'json.dumps' in profiler.report()
+        profiler.write('/tmp/vapid-profile')
+        assert open('/tmp/vapid-profile.folded').read() == (
+            profiler.collapsed())
+        os.unlink('/tmp/vapid-profile.folded')
+        os.unlink('/tmp/vapid-profile.txt')
+
+    def test_vectors(self):
+        generated = list(vectors.generate(24, keys=3, seed=1))
+        assert sum(1 for v in generated if not v['valid']) == 6
+        assert set(v['tamper'] for v in generated) == set(
+            vectors.TAMPERS + (None,))
+        report = vectors.verify(generated)
+        assert report['vectors'] == 24
+        assert report['failures'] == {}
+        # A vector that claims the wrong outcome is reported
+        generated[3]['valid'] = True
+        generated[0]['signing_input'] += 'x'
+        assert sorted(vectors.verify(generated)['failures']) == [0, 3]
+
+    @unittest.skipUnless(os.path.exists(VECTORS), "no shared test vectors")
+    def test_shared_vectors(self):
+        report = vectors.verify(vectors.read(VECTORS))
+        assert report['vectors'] > 0
+        assert report['failures'] == {}
+
+    def run_main(self, *argv):
+        with patch.object(sys, 'argv', ['vapid'] + list(argv)):
+            vapid_main()
+
+    def test_main_import_keys(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        store = os.path.join(tmp, 'keys.store')
+        der = os.path.join(tmp, 'tenant2.der')
+        with open(der, 'w') as ff:
+            ff.write(TEST_KEY_PRIVATE_DER)
+        self.run_main('--store', store, '--import-keys', '/tmp/private', der)
+        # Re-importing an existing tenant is skipped, not duplicated
+        self.run_main('--store', store, '--import-keys', '/tmp/private')
+        with VapidKeyStore(store) as ks:
+            assert sorted(ks) == ['private', 'tenant2']
+            self.check_keys(ks.get('private'))
+            self.check_keys(ks.get('tenant2'))
+        assert os.path.getsize(store) == 8 + 2 * 162
+
+    def test_main_profile(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        claims = os.path.join(tmp, 'claims.json')
+        prefix = os.path.join(tmp, 'prof')
+        with open(claims, 'w') as file:
+            json.dump({"sub": "mailto:admin@example.com",
+                       "aud": "https://push.example.com"}, file)
+        with patch('sys.stdout'), patch('sys.stderr') as stderr:
+            self.run_main('-k', '/tmp/private', '--sign', claims,
+                          '--profile', prefix)
+        assert stderr.write.called
+        with open(prefix + '.txt') as file:
+            assert 'sign' in file.read()
+        assert os.path.getsize(prefix + '.folded') > 0
+        assert profiling.disable() is None
+
     def test_integration(self):
         # These values were taken from a test page. DO NOT ALTER!
         key = ("BDd3_hVL9fZi9Ybo2UUzA284WG5FZR30_95YeZJsiApwXKpNcF1rRPF3foI"
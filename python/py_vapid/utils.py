@@ -1,5 +1,7 @@
 import base64
 import binascii
+import os
+import tempfile
 
 
 def b64urldecode(data):
@@ -37,3 +39,80 @@ def num_to_bytes(n, pad_to):
     h = '%x' % n
     r = binascii.unhexlify('0' * (len(h) % 2) + h)
     return b'\x00' * (pad_to - len(r)) + r
+
+
+def write_atomic(path, data, mode=0o600, overwrite=True):
+    """Write `data` to `path` so readers never see a partial file.
+
+    The data is written and fsync'd to a temporary file in the same
+    directory, then moved into place and the directory fsync'd, so the
+    new entry survives a crash where the platform allows it.
+
+    :param path: Destination file name
+    :type path: str
+    :param data: Content to write
+    :type data: bytes
+    :param mode: Permission bits for the new file
+    :type mode: int
+    :param overwrite: Replace an existing file. If False and `path` already
+        exists, nothing is written. On filesystems without hard links the
+        new file is created exclusively and written in place instead.
+    :type overwrite: bool
+    :returns bool indicating whether `path` now holds `data`
+
+    """
+    dirname = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=dirname, prefix=".vapid-")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        # os.fchmod is not available on Windows before Python 3.13
+        os.chmod(tmp, mode)
+        if overwrite:
+            os.replace(tmp, path)
+            _fsync_dir(dirname)
+            return True
+        # link() refuses to clobber an existing file, so only one of several
+        # racing writers wins.
+        try:
+            os.link(tmp, path)
+            written = True
+        except FileExistsError:
+            return False
+        except OSError:
+            written = _write_exclusive(path, data, mode)
+        if written:
+            _fsync_dir(dirname)
+        return written
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+def _fsync_dir(dirname):
+    try:
+        fd = os.open(dirname, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+    except OSError:
+        # Directories cannot be opened on Windows
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        # Not supported by every filesystem
+        pass
+    finally:
+        os.close(fd)
+
+
+def _write_exclusive(path, data, mode):
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, mode)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    return True
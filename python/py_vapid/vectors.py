@@ -0,0 +1,242 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""Generate and check cross-implementation VAPID test vectors.
+
+Vectors are stored one JSON object per line:
+
+    id             sequence number
+    version        "vapid" (RFC8292) or "webpush" (Draft-01)
+    private_key    Base64url raw private scalar of the signing key
+    public_key     Base64url uncompressed public key carried in the headers
+    claims         the claims that were signed
+    signing_input  expected JWS header and claims segments, byte for byte
+    headers        the request headers a push service would receive
+    valid          whether the headers must verify
+    tamper         how an invalid vector was altered, or null
+
+    python -m py_vapid.vectors generate -n 10000 -o vectors.ndjson
+    python -m py_vapid.vectors verify vectors.ndjson
+
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+
+from cryptography.exceptions import InvalidSignature
+
+from py_vapid import Vapid01, Vapid02
+from py_vapid.compact import CompactVapid
+from py_vapid.crypto_key import CryptoKey
+from py_vapid.jwt import decode, signing_input
+from py_vapid.utils import b64urlencode
+
+TAMPERS = ("signature", "claims", "key", "truncated")
+
+# Fixed so that regenerated corpora only differ in keys and signatures.
+BASE_EXP = 4102444800  # 2100-01-01
+
+
+def _headers(version, token, key):
+    if version == "vapid":
+        return {"Authorization": "vapid t={},k={}".format(token, key)}
+    return {"Authorization": "WebPush {}".format(token),
+            "Crypto-Key": "p256ecdsa={}".format(key)}
+
+
+def _claims(rng, index):
+    claims = {
+        "aud": rng.choice([
+            "https://updates.push.services.mozilla.com",
+            "https://fcm.googleapis.com",
+            "https://web.push.apple.com",
+            "http://localhost:{}".format(rng.randint(1024, 65535)),
+        ]),
+        "sub": rng.choice([
+            "mailto:admin@example.com",
+            "mailto:push-ops+{}@example.org".format(index),
+            "https://example.com",
+        ]),
+        "exp": BASE_EXP + index,
+    }
+    if rng.random() < 0.3:
+        claims["cust-id"] = "{:08x}".format(rng.getrandbits(32))
+    if rng.random() < 0.1:
+        claims["note"] = "a \"quoted\" </script> value"
+    return claims
+
+
+def _tamper(kind, token, key, other_key):
+    payload, sig = token.rsplit(".", 1)
+    if kind == "signature":
+        # Change a character well inside the signature; the last one only
+        # carries padding bits for its final two.
+        pos = len(sig) // 2
+        sig = sig[:pos] + ("A" if sig[pos] != "A" else "B") + sig[pos + 1:]
+    elif kind == "truncated":
+        sig = sig[:-4]
+    elif kind == "claims":
+        header, claims = payload.split(".")
+        payload = "{}.{}".format(header, claims[:-2] + (
+            "fQ" if claims[-2:] != "fQ" else "fX"))
+    elif kind == "key":
+        key = other_key
+    return "{}.{}".format(payload, sig), key
+
+
+def generate(count, keys=16, tamper_every=4, seed=None):
+    """Generate `count` vectors, signed by a pool of `keys` keys.
+
+    Every `tamper_every`th vector is altered so that it must not verify.
+
+    :returns: iterator of vector dicts
+
+    """
+    rng = random.Random(seed)
+    signers = [CompactVapid.generate() for _ in range(keys)]
+    for index in range(count):
+        signer = signers[index % len(signers)]
+        version = "vapid" if index % 2 == 0 else "webpush"
+        claims = _claims(rng, index)
+        if version == "vapid":
+            auth = signer.sign(claims)["Authorization"]
+            token = auth.split(" t=", 1)[1].split(",k=", 1)[0]
+        else:
+            auth = Vapid01(signer.private_key).sign(claims)["Authorization"]
+            token = auth.split(" ", 1)[1]
+        key = signer.application_server_key
+        tamper = None
+        if tamper_every and index % tamper_every == tamper_every - 1:
+            tamper = TAMPERS[(index // tamper_every) % len(TAMPERS)]
+            other = signers[(index + 1) % len(signers)]
+            token, key = _tamper(
+                tamper, token, key, other.application_server_key)
+        yield {
+            "id": index,
+            "version": version,
+            "private_key": b64urlencode(signer.private_raw),
+            "public_key": key,
+            "claims": claims,
+            "signing_input": signing_input(claims),
+            "headers": _headers(version, token, key),
+            "valid": tamper is None,
+            "tamper": tamper,
+        }
+
+
+def check(vector):
+    """Check a single vector, returning a list of failure descriptions."""
+    failures = []
+    headers = vector["headers"]
+    auth = headers["Authorization"]
+    try:
+        if vector["version"] == "vapid":
+            verified = Vapid02.verify(auth)
+            token = auth.split(" t=", 1)[1].split(",k=", 1)[0]
+            key = auth.split(",k=", 1)[1]
+        else:
+            verified = Vapid01.verify(headers["Crypto-Key"], auth)
+            token = auth.split(" ", 1)[1]
+            key = CryptoKey.parse(headers["Crypto-Key"]).get("p256ecdsa")
+    except Exception:
+        verified = False
+        token = key = None
+    if verified != vector["valid"]:
+        failures.append("verify returned {}".format(verified))
+    if token is not None:
+        try:
+            claims = decode(token, key)
+        except InvalidSignature:
+            claims = None
+        if vector["valid"] and claims != vector["claims"]:
+            failures.append("decode returned {!r}".format(claims))
+        if not vector["valid"] and claims is not None:
+            failures.append("decode accepted a tampered token")
+    if signing_input(vector["claims"]) != vector["signing_input"]:
+        failures.append("signing input differs")
+    if vector["valid"] and token and not token.startswith(
+            vector["signing_input"] + "."):
+        failures.append("token does not sign the expected input")
+    if vector["tamper"] != "key":
+        signer = CompactVapid.from_raw(vector["private_key"].encode("utf8"))
+        if signer.application_server_key != vector["public_key"]:
+            failures.append("public key does not match private key")
+    return failures
+
+
+def verify(vectors):
+    """Check every vector and time the run.
+
+    :returns: dict with the counts, failures, and vectors per second
+
+    """
+    failures = {}
+    count = 0
+    start = time.perf_counter()
+    for vector in vectors:
+        count += 1
+        problems = check(vector)
+        if problems:
+            failures[vector["id"]] = problems
+    elapsed = time.perf_counter() - start
+    return {
+        "vectors": count,
+        "failed": len(failures),
+        "failures": failures,
+        "seconds": round(elapsed, 3),
+        "per_second": round(count / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def read(path):
+    """Iterate over the vectors stored in `path`."""
+    with open(path, "r") as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="VAPID test vectors")
+    commands = parser.add_subparsers(dest="command")
+    gen = commands.add_parser("generate", help="generate a vector corpus")
+    gen.add_argument('--count', '-n', type=int, default=1000)
+    gen.add_argument('--keys', type=int, default=16,
+                     help='number of distinct signing keys')
+    gen.add_argument('--seed', type=int, default=None,
+                     help='seed for the generated claims')
+    gen.add_argument('--out', '-o', default=None,
+                     help='output file (default: stdout)')
+    ver = commands.add_parser("verify", help="verify a vector corpus")
+    ver.add_argument('file', nargs='+')
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        out = open(args.out, "w") if args.out else sys.stdout
+        try:
+            for vector in generate(args.count, args.keys, seed=args.seed):
+                out.write(json.dumps(vector, sort_keys=True) + "\n")
+        finally:
+            if args.out:
+                out.close()
+        return 0
+    if args.command == "verify":
+        status = 0
+        for path in args.file:
+            report = verify(read(path))
+            print("{}: {vectors} vectors, {failed} failed, {seconds}s "
+                  "({per_second} vectors/s)".format(path, **report))
+            for vid, problems in sorted(report["failures"].items()):
+                print("  #{}: {}".format(vid, "; ".join(problems)))
+            if report["failed"]:
+                status = 1
+        return status
+    parser.print_help()
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())